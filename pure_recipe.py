@@ -1,17 +1,48 @@
-from recipe_scrapers import scrape_me
-from rich.console import Console
-from rich.markdown import Markdown
 import argparse
-import yaml
+import functools
+import time
 import os
-import platformdirs
-
-console = Console()
+import re
+
+# Heavier dependencies (recipe_scrapers, requests, rich, yaml, platformdirs),
+# and stdlib modules only needed for fetching, are imported where they are
+# used, so that e.g. --help starts instantly.
+
+WHITESPACE = re.compile(r"\s")
+# Encoding declared by a page itself, e.g. <meta charset="utf-8">
+META_CHARSET = re.compile(rb"""<meta[^>]+charset=["']?\s*([\w.:-]+)""", re.IGNORECASE)
+
+# Number of recipe pages downloaded at once in list mode
+MAX_WORKERS = 16
+# Number of those downloads allowed against a single site
+MAX_PER_HOST = 4
+# Fewest pages worth parsing in a process pool in list mode
+MIN_PARALLEL_PARSE = 3
+# Bytes searched from the start of a page for its <meta charset>
+CHARSET_SNIFF_SIZE = 4096
+# Bytes read from the start of a saved recipe to find its title
+TITLE_READ_SIZE = 512
+# Downloaded pages are reused for this many hours unless config.yaml says otherwise
+DEFAULT_CACHE_HOURS = 24
+
+# Layout of a saved recipe; each section's lines end with a newline
+MARKDOWN_TEMPLATE = (
+    "# {title}\n"
+    "{meta}"
+    "\n## Ingredients\n"
+    "{ingredients}"
+    "\n## Instructions\n"
+    "{instructions}"
+)
+
+HEADERS = {
+    "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64; rv:86.0) Gecko/20100101 Firefox/86.0"
+}
 
 
 def main():
-    settings = load_yaml()
     args = parse_arguments()
+    settings = load_yaml()
     url = args.url
 
     try: 
@@ -22,11 +53,23 @@ def main():
         elif args.operations == "list":
             save_list_of_recipes(args.url, settings)
         elif args.operations == "browse":
-            browse_recipes()
+            browse_recipes(settings)
         else: 
-            console.print("Invlaid operation. See documentation.", style="bright_red")
+            get_console().print("Invlaid operation. See documentation.", style="bright_red")
     except Exception as e:
-        console.print(f"\nAn error occured: {str(e)}", style="bright_red bold")
+        get_console().print(f"\nAn error occured: {str(e)}", style="bright_red bold")
+
+
+@functools.lru_cache(maxsize=1)
+def get_console():
+    """
+    Creates the shared rich Console on first use.
+
+    :rtype: rich.console.Console
+    """
+    from rich.console import Console
+
+    return Console()
 
 
 def format_file_name(recipe_title):
@@ -37,155 +80,493 @@ def format_file_name(recipe_title):
     :return: formatted title
     :rtype: string
     """
-    s = list(recipe_title.lower())
+    return WHITESPACE.sub("-", recipe_title.lower())
 
-    for i, char in enumerate(s):
-        if char.isspace():
-            s[i] = "-"
-    return "".join(s)
 
+def create_session():
+    """
+    Creates an HTTP session whose connection pool is sized for list mode,
+    so connections are reused across recipes from the same site.
 
-def save_recipe_to_markdown(recipe_url, yaml_settings):
+    :rtype: requests.Session
     """
-    Scrapes recipe URL and saves to markdown file.
+    import requests
 
-    :param url: a url string from a recipe website
+    session = requests.Session()
+    adapter = requests.adapters.HTTPAdapter(
+        pool_connections=MAX_WORKERS, pool_maxsize=MAX_WORKERS
+    )
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+def get_cache_path(recipe_url):
+    """
+    Finds where the downloaded page for a recipe URL is cached.
 
+    :param recipe_url: a url string from a recipe website
     :rtype: string
-    :return: path to file
+    :return: path to the cached html file
     """
+    import hashlib
+    import platformdirs
+
+    digest = hashlib.sha1(recipe_url.encode("utf-8")).hexdigest()
+    return os.path.join(
+        platformdirs.user_cache_dir(), "pure_recipe", "html", digest + ".html"
+    )
+
+
+def get_cache_ttl(yaml_settings):
+    """
+    Reads how long downloaded pages stay cached from the settings.
+    load_yaml has already checked that cache_hours is a number.
+
+    :rtype: float
+    :return: cache lifetime in seconds, 0 when caching is turned off
+    """
+    return yaml_settings.get("cache_hours", DEFAULT_CACHE_HOURS) * 60 * 60
+
+
+def decode_html(response):
+    """
+    Decodes a downloaded page. Without a charset in the Content-Type header,
+    requests would assume ISO-8859-1, so the page's own <meta charset> is
+    used instead, falling back to the encoding guessed from its bytes.
+
+    :param response: requests.Response for the page
+    :rtype: string
+    :return: html of the page
+    """
+    if "charset=" in response.headers.get("Content-Type", "").lower():
+        return response.text
+
+    match = META_CHARSET.search(response.content[:CHARSET_SNIFF_SIZE])
+    encoding = match.group(1).decode("ascii") if match else response.apparent_encoding
     try:
-        scraper = scrape_me(recipe_url)
-    except Exception as e:
-        console.print(f"\nCould not scrape recipe, error: {str(e)}", style="bright_cyan bold")
+        return response.content.decode(encoding or "utf-8", errors="replace")
+    except LookupError:
+        return response.content.decode("utf-8", errors="replace")
+
+
+def fetch_html(recipe_url, session=None, max_age=DEFAULT_CACHE_HOURS * 60 * 60):
+    """
+    Downloads the page for a recipe URL.
+    Pages fetched within the last max_age seconds are read from disk instead.
+
+    :param recipe_url: a url string from a recipe website
+    :param session: optional requests.Session to reuse connections
+    :param max_age: seconds a cached page stays valid, 0 to skip the cache
+    :rtype: string
+    :return: html of the recipe page
+    """
+    import tempfile
+
+    cache_path = get_cache_path(recipe_url)
+    try:
+        if time.time() - os.path.getmtime(cache_path) < max_age:
+            with open(cache_path, "r", encoding="utf-8") as f:
+                return f.read()
+    except OSError:
+        pass
+
+    if session is None:
+        import requests
+
+        session = requests
+    response = session.get(recipe_url, headers=HEADERS, timeout=10)
+    response.raise_for_status()
+    html = decode_html(response)
+    if max_age <= 0:
+        return html
+
+    # Write to a temporary file first so concurrent fetches never see half a page
+    temp_path = None
+    try:
+        os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(cache_path), suffix=".tmp")
+        with open(fd, "w", encoding="utf-8") as f:
+            f.write(html)
+        os.replace(temp_path, cache_path)
+    except OSError:
+        if temp_path is not None:
+            discard_file(temp_path)
+
+    return html
+
+
+def discard_file(path):
+    """
+    Removes a file if it exists, ignoring errors.
+
+    :param path: file to remove
+    """
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+def discard_cached_html(recipe_url):
+    """
+    Drops the cached page for a recipe URL, e.g. after it failed to parse,
+    so the next attempt downloads it again.
+
+    :param recipe_url: a url string from a recipe website
+    """
+    discard_file(get_cache_path(recipe_url))
+
+
+def scrape_recipe(recipe_url, html):
+    """
+    Parses a recipe page.
+
+    :param recipe_url: a url string from a recipe website
+    :param html: the downloaded page
+    :return: scraper for the recipe
+    """
+    from recipe_scrapers import scrape_html
+
+    return scrape_html(html, org_url=recipe_url)
+
+
+def build_markdown(scraper, yaml_settings):
+    """
+    Formats a scraped recipe as markdown.
+
+    :param scraper: scraper returned by scrape_recipe
+    :rtype: string
+    :return: markdown document for the recipe
+    """
+    meta = []
+    if yaml_settings["yield"] != False:
+        meta.append(f"**Serves:** {scraper.yields()}\n")
+    if yaml_settings["time"] != False:
+        meta.append(f"**Total Time:** {scraper.total_time()} mins\n")
+
+    return MARKDOWN_TEMPLATE.format(
+        title=scraper.title(),
+        meta="".join(meta),
+        ingredients="".join(
+            f"- {ingredient}\n" for ingredient in scraper.ingredients()
+        ),
+        instructions="".join(
+            f"{index}. {instruction}\n"
+            for index, instruction in enumerate(scraper.instructions_list(), 1)
+        ),
+    )
+
+
+def render_recipe(recipe_url, html, yaml_settings):
+    """
+    Parses a downloaded recipe page and formats it as markdown.
+    Runs in a worker process in list mode, so everything it takes and returns is picklable.
+
+    :param recipe_url: a url string from a recipe website
+    :param html: the downloaded page
+    :rtype: tuple
+    :return: recipe title and markdown document
+    """
+    scraper = scrape_recipe(recipe_url, html)
+    return scraper.title(), build_markdown(scraper, yaml_settings)
+
+
+def write_markdown(title, md_content, yaml_settings, dir_fd=None):
+    """
+    Saves a markdown recipe in the recipe directory.
+
+    :param title: recipe title, used for the file name
+    :param md_content: markdown document to save
+    :param dir_fd: optional open descriptor of the recipe directory, so the
+        directory path is not looked up again for every file
+    :rtype: string
+    :return: path to file
+    """
     directory = yaml_settings.get("directory")
     # if not os.path.exists(directory):
     #   os.makedirs(directory, mode="0o777")
-    title = scraper.title().replace(" ", "-")
-    recipe_file = directory + "/" + format_file_name(title) + ".md"
+    file_name = format_file_name(title) + ".md"
+    recipe_file = directory + "/" + file_name
+
+    # The whole document is built first so it reaches the file in one write
+    if dir_fd is None:
+        with open(recipe_file, "w", encoding="utf-8") as text_file:
+            text_file.write(md_content)
+        return recipe_file
 
-    with open(recipe_file, "w+") as text_file:
-        print(f"# {title}", file=text_file)
+    fd = os.open(
+        file_name, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o666, dir_fd=dir_fd
+    )
+    try:
+        data = memoryview(md_content.encode("utf-8"))
+        while data:
+            data = data[os.write(fd, data):]
+    finally:
+        os.close(fd)
+
+    return recipe_file
 
-        if yaml_settings["yield"] != False:
-            print(f"**Serves:** {scraper.yields()}", file=text_file)
-        if yaml_settings["time"] != False:
-            print(f"**Total Time:** {scraper.total_time()} mins", file=text_file)
 
-        print(f"\n## Ingredients", file=text_file)
+def save_recipe_to_markdown(recipe_url, yaml_settings):
+    """
+    Scrapes recipe URL and saves to markdown file.
 
-        for ingredient in scraper.ingredients():
-            print(f"-", ingredient, file=text_file)
+    :param url: a url string from a recipe website
 
-        print(f"\n## Instructions", file=text_file)
+    :rtype: tuple
+    :return: path to file and the markdown written to it, or None if the
+        recipe could not be scraped
+    """
+    try:
+        html = fetch_html(recipe_url, max_age=get_cache_ttl(yaml_settings))
+        title, md_content = render_recipe(recipe_url, html, yaml_settings)
+    except Exception as e:
+        discard_cached_html(recipe_url)
+        get_console().print(f"\nCould not scrape recipe, error: {str(e)}", style="bright_cyan bold")
+        return None
+    return write_markdown(title, md_content, yaml_settings), md_content
 
-        for index, instruction in enumerate(scraper.instructions_list()):
-            print(f"{index+1}.", instruction, file=text_file)
 
-    return recipe_file
+def print_markdown(md_content):
+    """
+    Renders a markdown string on the shared console.
 
+    :param md_content: markdown document to show
+    """
+    from rich.markdown import Markdown
 
-def print_markdown(md):
-    console.print("\n")
-    console.print(md)
-    console.print("\n")
+    get_console().print("\n", Markdown(md_content), "\n")
     return True
 
 
 def view_recipe(recipe_url, yaml_settings):
     """
     Scrapes recipe url and returns markdown-formatted recipe to terminal output.
-
+    The user can then choose to save it.
 
     :param url: a url string from a recipe website
     :rtype: bool
     :return: True if successful, False otherwise.
     """
     try:
-        file_path = save_recipe_to_markdown(recipe_url, yaml_settings)
-        f = open(file_path, "r")
-        md = Markdown(f.read())
-        f.close()
-        print_markdown(md)
+        html = fetch_html(recipe_url, max_age=get_cache_ttl(yaml_settings))
+        title, md_content = render_recipe(recipe_url, html, yaml_settings)
     except:
-        console.print("\nError in view_recipe function.\n", style="bright_red")
+        discard_cached_html(recipe_url)
+        get_console().print("\nError in view_recipe function.\n", style="bright_red")
         return False
 
+    print_markdown(md_content)
+
+    # No answer (closed or piped stdin, Ctrl+C) means don't save
+    try:
+        inp = input("Enter 's' to save this recipe. Or, press enter to quit.\n")
+    except (EOFError, KeyboardInterrupt):
+        inp = ""
+
+    # Save exactly what was shown, without parsing the page again
+    if inp == "s":
+        write_markdown(title, md_content, yaml_settings)
+
     return True
 
 
+def read_url_list(path):
+    """
+    Reads recipe URLs from a file, one per line.
+    Blank lines, lines starting with '#' and repeated URLs are skipped.
+
+    :param path: path to the list file
+    :rtype: list
+    :return: URLs in the order they first appear
+    """
+    with open(path, "rb") as f:
+        lines = f.read().splitlines()
+
+    urls = (line.strip().decode("utf-8") for line in lines)
+    return list(dict.fromkeys(url for url in urls if url and not url.startswith("#")))
+
+
 def save_list_of_recipes(url, settings):
-    os.chdir(settings["directory"])
-    f = open(url, "r")
-    for line in f:
+    """
+    Saves every recipe listed in a file, one URL per line.
+    Pages are downloaded concurrently and parsed in parallel, then saved in order.
+    """
+    from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+    from urllib.parse import urlparse
+    import threading
+
+    # List files live in the recipe directory unless given an absolute path
+    urls = read_url_list(os.path.join(settings["directory"], url))
+
+    session = create_session()
+    max_age = get_cache_ttl(settings)
+    host_limits = {
+        urlparse(single_url).netloc: threading.BoundedSemaphore(MAX_PER_HOST)
+        for single_url in urls
+    }
+
+    def fetch(single_url):
         try:
-            single_url = line.strip().rstrip("\n")
-            save_recipe_to_markdown(single_url, settings)
+            with host_limits[urlparse(single_url).netloc]:
+                return fetch_html(single_url, session, max_age)
+        except Exception as e:
+            return e
+
+    with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
+        pages = list(executor.map(fetch, urls))
+
+    fetched = []
+    for single_url, html in zip(urls, pages):
+        if isinstance(html, Exception):
+            get_console().print(
+                f"\nCould not fetch {single_url}, error: {str(html)}",
+                style="bright_cyan bold",
+            )
+        else:
+            fetched.append((single_url, html))
+    if not fetched:
+        return
+
+    # Open the recipe directory once and create every file relative to it
+    dir_fd = None
+    if os.open in os.supports_dir_fd and hasattr(os, "O_DIRECTORY"):
+        dir_fd = os.open(settings["directory"], os.O_RDONLY | os.O_DIRECTORY)
+
+    def save_rendered(single_url, get_result):
+        try:
+            title, md_content = get_result()
+        except Exception as e:
+            discard_cached_html(single_url)
+            get_console().print(
+                f"\nCould not scrape {single_url}, error: {str(e)}",
+                style="bright_cyan bold",
+            )
+            return
+        try:
+            write_markdown(title, md_content, settings, dir_fd)
         except:
-            console.print(
+            get_console().print(
                 "\nFile error. Try again using proper file format. See documentation.\n",
                 style="bright_red",
             )
 
+    try:
+        # A few pages parse faster here than it takes to start worker processes
+        if len(fetched) < MIN_PARALLEL_PARSE:
+            for single_url, html in fetched:
+                save_rendered(
+                    single_url,
+                    functools.partial(render_recipe, single_url, html, settings),
+                )
+            return
+
+        # Parsing is CPU-bound, so spread it over processes rather than threads
+        with ProcessPoolExecutor(max_workers=min(len(fetched), os.cpu_count() or 1)) as executor:
+            futures = [
+                executor.submit(render_recipe, single_url, html, settings)
+                for single_url, html in fetched
+            ]
+            for (single_url, _), future in zip(fetched, futures):
+                save_rendered(single_url, future.result)
+    finally:
+        if dir_fd is not None:
+            os.close(dir_fd)
+
+
+def list_saved_recipes(directory):
+    """
+    Finds the saved recipes in a folder.
 
-def browse_recipes():
+    :param directory: folder containing markdown recipes
+    :rtype: list
+    :return: (title, path) pairs, one per markdown file
+    """
+    recipes = []
+    with os.scandir(directory) as entries:
+        for entry in entries:
+            if not entry.name.endswith(".md") or not entry.is_file(follow_symlinks=False):
+                continue
+            # The title is on the first line, so a short unbuffered read is enough
+            with open(entry.path, "rb", buffering=0) as f:
+                head = f.read(TITLE_READ_SIZE)
+            title = head.split(b"\n", 1)[0].lstrip(b"#").strip()
+            title = title.decode("utf-8", errors="replace")
+            recipes.append((title, entry.path))
+    return recipes
+
+
+def browse_recipes(settings):
     """
     Allow user to browse previously-saved recipes.
-    User can choose 1 to view in terminal.
+    User can choose 1 to view in terminal, then go back to the list.
     """
-    with open("config.yaml", "r") as file:
-        settings = yaml.safe_load(file)
-
     directory = settings.get("directory")
 
     print(directory)
 
-    files_to_paths = {}
+    recipes = []
+    scanned_mtime = None
 
-    def print_titles(recipe_path):
-        with open(recipe_path, "r") as f:
-            title = f.readline().lstrip("#")
-            console.print((index + 1), title, style="green")
+    while True:
+        # Only re-read the folder when a recipe was added or removed
+        mtime = os.stat(directory).st_mtime
+        if mtime != scanned_mtime:
+            recipes = list_saved_recipes(directory)
+            scanned_mtime = mtime
 
-    # Add files to file_to_paths dictionary
-    # And print each filename for selection
-    for index, file in enumerate(os.listdir(directory)):
-        filename = os.fsdecode(file)
-        file_path = directory + '/' + filename
-        if filename.endswith(".md"):
-            files_to_paths.update({filename: file_path})
-            print_titles(file_path)
+        for number, (title, _) in enumerate(recipes, 1):
+            get_console().print(number, title, style="green")
 
-    def choose_recipe():
-        file_path = ""
-
-        inp = input("Enter a number to choose a recipe. Or, enter 'q' to quit.\n")
+        # No answer (closed or piped stdin, Ctrl+C) means quit
+        try:
+            inp = input("Enter a number to choose a recipe. Or, enter 'q' to quit.\n")
+        except (EOFError, KeyboardInterrupt):
+            inp = "q"
 
         if inp == "q":
-            exit()
+            return
 
         try:
-            choice = int(inp) - 1
-            file_path = list(files_to_paths.values())[choice]
-        except:
-            console.print("\nInput error. Try again.\n", style="bright_red")
-            choose_recipe()
-
-        if file:
-            f = open(file_path, "r")
-            md = Markdown(f.read())
-            print_markdown(md)
+            choice = int(inp)
+            if not 1 <= choice <= len(recipes):
+                raise ValueError(inp)
+        except ValueError:
+            get_console().print("\nInput error. Try again.\n", style="bright_red")
+            continue
+
+        # Clear through rich so the recipe and the menu each start on a fresh screen
+        with open(recipes[choice - 1][1], "r", encoding="utf-8") as f:
+            get_console().clear()
+            print_markdown(f.read())
 
-    choose_recipe()
+        try:
+            inp = input("Press enter to go back to your recipes. Or, enter 'q' to quit.\n")
+        except (EOFError, KeyboardInterrupt):
+            inp = "q"
+        if inp == "q":
+            return
+        get_console().clear()
 
 
+@functools.lru_cache(maxsize=1)
 def load_yaml():
     """
     Loads yaml settings. Searches for a config file, creating one if not present.
+    The result is cached, so the config is only read once per run.
 
     :rtype: dictionary
     :return: mappings for each setting. ex: {time: 'true'}
     """
+    import platformdirs
+    import yaml
+
+    # Prefer the libyaml-backed loader, falling back to the pure-Python one
+    try:
+        from yaml import CSafeLoader as YamlLoader
+    except ImportError:
+        from yaml import SafeLoader as YamlLoader
 
     config_dir = os.path.join(platformdirs.user_config_dir(), "pure_recipe")
     config_path = "config.yaml"
@@ -202,7 +583,7 @@ def load_yaml():
 
     # Open the file since we can be sure it exists now
     with open(config_path, "r") as file:
-        settings = yaml.safe_load(file)
+        settings = yaml.load(file, Loader=YamlLoader)
 
     # Catch an empty file, even if it wasn't just created
     if settings is None:
@@ -222,12 +603,28 @@ def load_yaml():
         settings["time"] = "true"
     if settings.get("yield") is None or "":
         settings["yield"] = "true"
+    if settings.get("cache_hours") in (None, ""):
+        settings["cache_hours"] = DEFAULT_CACHE_HOURS
+    try:
+        settings["cache_hours"] = float(settings["cache_hours"])
+    except (TypeError, ValueError):
+        print(
+            f"Invalid cache_hours in config.yaml: {settings['cache_hours']!r}. "
+            f"Expected a number of hours, using {DEFAULT_CACHE_HOURS}."
+        )
+        settings["cache_hours"] = DEFAULT_CACHE_HOURS
 
     # Update the settings file with the changed field(s)
     return settings
 
 
-def parse_arguments():
+@functools.lru_cache(maxsize=1)
+def build_parser():
+    """
+    Creates the command-line parser. Built once and reused.
+
+    :rtype: argparse.ArgumentParser
+    """
     parser = argparse.ArgumentParser(
         prog="Pure Recipe", description="Make recipes pretty again."
     )
@@ -235,7 +632,11 @@ def parse_arguments():
     parser.add_argument("operations", choices=["view", "save", "list", "browse"])
     parser.add_argument("url", default="foo", nargs="?")
 
-    return parser.parse_args()
+    return parser
+
+
+def parse_arguments(args=None):
+    return build_parser().parse_args(args)
 
 
 if __name__ == "__main__":
@@ -1,4 +1,9 @@
-from pure_recipe import main, format_file_name, save_to_markdown, view_in_terminal, load_config
+import os
+
+import pytest
+
+import pure_recipe
+from pure_recipe import main, format_file_name, save_recipe_to_markdown, view_recipe, load_yaml, parse_arguments, build_markdown, read_url_list, write_markdown, fetch_html, list_saved_recipes, save_list_of_recipes, browse_recipes
 
 
 def test_format_file_name():
@@ -6,3 +11,256 @@ def test_format_file_name():
     assert format_file_name(recipe_title) == "chocolate-chip-cookies"
 
 
+def test_format_file_name_other_whitespace():
+    recipe_title = "Pad\tThai  Noodles"
+    assert format_file_name(recipe_title) == "pad-thai--noodles"
+
+
+def test_parse_arguments():
+    args = parse_arguments(["view", "https://example.com/recipe"])
+    assert args.operations == "view"
+    assert args.url == "https://example.com/recipe"
+    assert parse_arguments(["browse"]).url == "foo"
+
+
+class FakeScraper:
+    def title(self):
+        return "Beef Stew"
+
+    def yields(self):
+        return "4 servings"
+
+    def total_time(self):
+        return 90
+
+    def ingredients(self):
+        return ["1 lb beef", "2 carrots"]
+
+    def instructions_list(self):
+        return ["Brown beef.", "Simmer."]
+
+
+def test_build_markdown():
+    settings = {"yield": "true", "time": False}
+    assert build_markdown(FakeScraper(), settings) == (
+        "# Beef Stew\n"
+        "**Serves:** 4 servings\n"
+        "\n## Ingredients\n"
+        "- 1 lb beef\n"
+        "- 2 carrots\n"
+        "\n## Instructions\n"
+        "1. Brown beef.\n"
+        "2. Simmer.\n"
+    )
+
+
+def test_read_url_list(tmp_path):
+    list_file = tmp_path / "recipes.txt"
+    list_file.write_text(
+        "https://example.com/a\n"
+        "\n"
+        "# saved for later\n"
+        "  https://example.com/b  \r\n"
+        "https://example.com/a\n"
+    )
+    assert read_url_list(list_file) == ["https://example.com/a", "https://example.com/b"]
+
+
+@pytest.mark.skipif(
+    os.open not in os.supports_dir_fd or not hasattr(os, "O_DIRECTORY"),
+    reason="needs dir_fd support",
+)
+def test_write_markdown_with_dir_fd(tmp_path):
+    md_content = "# Crème Brûlée\n"
+    dir_fd = os.open(tmp_path, os.O_RDONLY | os.O_DIRECTORY)
+    try:
+        path = write_markdown("Crème Brûlée", md_content, {"directory": str(tmp_path)}, dir_fd)
+    finally:
+        os.close(dir_fd)
+
+    assert path == f"{tmp_path}/crème-brûlée.md"
+    assert (tmp_path / "crème-brûlée.md").read_bytes() == md_content.encode("utf-8")
+
+
+@pytest.mark.skipif(
+    os.open not in os.supports_dir_fd or not hasattr(os, "O_DIRECTORY"),
+    reason="needs dir_fd support",
+)
+def test_write_markdown_permissions_match_open(tmp_path):
+    settings = {"directory": str(tmp_path)}
+    write_markdown("Plain", "# Plain\n", settings)
+    dir_fd = os.open(tmp_path, os.O_RDONLY | os.O_DIRECTORY)
+    try:
+        write_markdown("Listed", "# Listed\n", settings, dir_fd)
+    finally:
+        os.close(dir_fd)
+
+    plain_mode = os.stat(tmp_path / "plain.md").st_mode
+    assert os.stat(tmp_path / "listed.md").st_mode == plain_mode
+
+
+class FakeResponse:
+    def __init__(
+        self,
+        content=b"<html>recipe</html>",
+        content_type="text/html; charset=utf-8",
+        apparent_encoding="utf-8",
+    ):
+        self.content = content
+        self.headers = {"Content-Type": content_type}
+        self.apparent_encoding = apparent_encoding
+
+    @property
+    def text(self):
+        # Like requests, fall back to ISO-8859-1 when the header has no charset
+        content_type = self.headers["Content-Type"]
+        charset = content_type.split("charset=")[1] if "charset=" in content_type else "iso-8859-1"
+        return self.content.decode(charset)
+
+    def raise_for_status(self):
+        pass
+
+
+class FakeSession:
+    def __init__(self, response=None):
+        self.requests = 0
+        self.response = response or FakeResponse()
+
+    def get(self, url, headers=None, timeout=None):
+        self.requests += 1
+        return self.response
+
+
+def test_fetch_html_uses_cache(tmp_path, monkeypatch):
+    monkeypatch.setattr(pure_recipe, "get_cache_path", lambda url: str(tmp_path / "page.html"))
+    session = FakeSession()
+
+    assert fetch_html("https://example.com/a", session) == "<html>recipe</html>"
+    assert fetch_html("https://example.com/a", session) == "<html>recipe</html>"
+    assert session.requests == 1
+
+
+def test_fetch_html_expired_cache(tmp_path, monkeypatch):
+    cache_file = tmp_path / "page.html"
+    cache_file.write_text("<html>old</html>")
+    os.utime(cache_file, (0, 0))
+    monkeypatch.setattr(pure_recipe, "get_cache_path", lambda url: str(cache_file))
+    session = FakeSession()
+
+    assert fetch_html("https://example.com/a", session) == "<html>recipe</html>"
+    assert session.requests == 1
+    assert cache_file.read_text() == "<html>recipe</html>"
+
+
+def test_fetch_html_without_cache(tmp_path, monkeypatch):
+    monkeypatch.setattr(pure_recipe, "get_cache_path", lambda url: str(tmp_path / "page.html"))
+    session = FakeSession()
+
+    fetch_html("https://example.com/a", session, max_age=0)
+    fetch_html("https://example.com/a", session, max_age=0)
+    assert session.requests == 2
+    assert not (tmp_path / "page.html").exists()
+
+
+def test_fetch_html_without_charset_header(tmp_path, monkeypatch):
+    monkeypatch.setattr(pure_recipe, "get_cache_path", lambda url: str(tmp_path / "page.html"))
+    page = '<html><head><meta charset="utf-8"><title>Crème brûlée</title></head></html>'
+    response = FakeResponse(page.encode("utf-8"), "text/html", apparent_encoding="ascii")
+
+    assert fetch_html("https://example.com/a", FakeSession(response)) == page
+    assert (tmp_path / "page.html").read_text(encoding="utf-8") == page
+
+
+def test_fetch_html_without_any_charset(tmp_path, monkeypatch):
+    monkeypatch.setattr(pure_recipe, "get_cache_path", lambda url: str(tmp_path / "page.html"))
+    page = "<html><title>Crème brûlée</title></html>"
+    response = FakeResponse(page.encode("utf-8"), "text/html", apparent_encoding="utf-8")
+
+    assert fetch_html("https://example.com/a", FakeSession(response), max_age=0) == page
+
+
+def test_list_saved_recipes(tmp_path):
+    (tmp_path / "beef-stew.md").write_text("# Beef Stew\n**Serves:** 4\n", encoding="utf-8")
+    (tmp_path / "drafts.md").mkdir()
+    (tmp_path / "notes.txt").write_text("# Not a recipe\n")
+
+    assert list_saved_recipes(str(tmp_path)) == [
+        ("Beef Stew", str(tmp_path / "beef-stew.md"))
+    ]
+
+
+class FakeConsole:
+    def __init__(self):
+        self.printed = []
+
+    def print(self, *objects, style=None):
+        self.printed.append(" ".join(str(o) for o in objects))
+
+    def clear(self):
+        pass
+
+
+def test_save_list_of_recipes(tmp_path, monkeypatch):
+    recipe_dir = tmp_path / "recipes"
+    recipe_dir.mkdir()
+    cache_dir = tmp_path / "cache"
+    cache_dir.mkdir()
+    (recipe_dir / "list.txt").write_text("https://example.com/stew\nhttps://example.com/broken\n")
+    (cache_dir / "broken.html").write_text("<html>consent wall</html>")
+
+    def fake_render(recipe_url, html, yaml_settings):
+        if "broken" in recipe_url:
+            raise ValueError("no recipe found")
+        return "Beef Stew", "# Beef Stew\n"
+
+    console = FakeConsole()
+    monkeypatch.setattr(pure_recipe, "create_session", lambda: None)
+    monkeypatch.setattr(pure_recipe, "get_console", lambda: console)
+    monkeypatch.setattr(pure_recipe, "fetch_html", lambda url, session, max_age: "<html></html>")
+    monkeypatch.setattr(pure_recipe, "render_recipe", fake_render)
+    monkeypatch.setattr(
+        pure_recipe, "get_cache_path", lambda url: str(cache_dir / (url.rsplit("/", 1)[1] + ".html"))
+    )
+
+    save_list_of_recipes("list.txt", {"directory": str(recipe_dir), "cache_hours": 24})
+
+    assert sorted(os.listdir(recipe_dir)) == ["beef-stew.md", "list.txt"]
+    assert (recipe_dir / "beef-stew.md").read_text(encoding="utf-8") == "# Beef Stew\n"
+    assert not (cache_dir / "broken.html").exists()
+    assert any("https://example.com/broken" in line for line in console.printed)
+
+
+def answer(reply):
+    def fake_input(prompt):
+        if isinstance(reply, BaseException):
+            raise reply
+        return reply
+
+    return fake_input
+
+
+@pytest.mark.parametrize(
+    "reply, saved",
+    [("s", True), ("", False), (EOFError(), False)],
+)
+def test_view_recipe_save_prompt(tmp_path, monkeypatch, reply, saved):
+    shown = []
+    monkeypatch.setattr(pure_recipe, "fetch_html", lambda url, max_age: "<html></html>")
+    monkeypatch.setattr(pure_recipe, "render_recipe", lambda url, html, settings: ("Beef Stew", "# Beef Stew\n"))
+    monkeypatch.setattr(pure_recipe, "print_markdown", shown.append)
+    monkeypatch.setattr("builtins.input", answer(reply))
+
+    assert view_recipe("https://example.com/stew", {"directory": str(tmp_path)}) is True
+    assert shown == ["# Beef Stew\n"]
+    assert (tmp_path / "beef-stew.md").exists() == saved
+
+
+@pytest.mark.parametrize("reply", [EOFError(), KeyboardInterrupt()])
+def test_browse_recipes_quits_without_input(tmp_path, monkeypatch, reply):
+    (tmp_path / "beef-stew.md").write_text("# Beef Stew\n", encoding="utf-8")
+    console = FakeConsole()
+    monkeypatch.setattr(pure_recipe, "get_console", lambda: console)
+    monkeypatch.setattr("builtins.input", answer(reply))
+
+    assert browse_recipes({"directory": str(tmp_path)}) is None
+    assert console.printed == ["1 Beef Stew"]